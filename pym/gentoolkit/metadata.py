@@ -23,11 +23,10 @@
     mbrola -> Adds support for mbrola voices
     >>> upstream = pkg_md.upstream()
     >>> upstream
-    [<_Upstream {'node': <Element 'upstream' at 0x7f952a73b2c0>,
-     'maintainers': [<_Maintainer 'msclrhd@gmail.com'>],
-     'changelogs': ['https://github.com/espeak-ng/espeak-ng/releases.atom'],
-     'docs': [], 'bugtrackers': [],
-     'remoteids': [('espeak-ng/espeak-ng', 'github')]}>]
+    (<_Upstream {'maintainers': (<_Maintainer 'msclrhd@gmail.com'>,),
+     'changelogs': ('https://github.com/espeak-ng/espeak-ng/releases.atom',),
+     'docs': (), 'bugtrackers': (),
+     'remoteids': (('espeak-ng/espeak-ng', 'github'),)}>,)
     >>> upstream[0].maintainers[0].name
     'Reece H. Dunn'
 """
@@ -39,16 +38,121 @@ __docformat__ = "epytext"
 # Imports
 # =======
 
-import re
-import xml.etree.cElementTree as etree
+import collections
+import os
+import sys
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from xml.parsers import expat
+
+# Parse results keyed by (absolute path, mtime_ns, size), least recently
+# used first
+_CACHE = collections.OrderedDict()
+_CACHE_LOCK = threading.Lock()
+_CACHE_SIZE = 4096
+
+# Files handed to each worker at a time by MetaData.parse_many()
+_PARSE_CHUNKSIZE = 32
+
+# Element and attribute names shared by every parser, so that the same
+# few tag strings are reused for all files
+_NAMES = {}
+
+# =========
+# Functions
+# =========
+
+
+def _parse(metadata_path):
+    """Read metadata.xml in one pass of the expat parser.
+
+    No element tree is built; L{_MetaDataHandler} creates the objects for
+    each section directly from the parser callbacks.
+
+    @type metadata_path: str
+    @param metadata_path: path to a valid metadata.xml file
+    @rtype: tuple
+    @return: tuples of descriptions, L{_Maintainer}, L{_Useflag} and
+            L{_Upstream} objects, in that order
+    @raise IOError: if C{metadata_path} can not be read
+    @raise xml.parsers.expat.ExpatError: if C{metadata_path} is not valid XML
+    """
+
+    handler = _MetaDataHandler()
+    parser = expat.ParserCreate(intern=_NAMES)
+    # Never read the external DTD; metadata.xml does not need it
+    parser.SetParamEntityParsing(expat.XML_PARAM_ENTITY_PARSING_NEVER)
+    # Deliver each run of text in a single callback
+    parser.buffer_text = True
+    parser.StartElementHandler = handler.start
+    parser.EndElementHandler = handler.end
+    parser.CharacterDataHandler = handler.data
+    with open(metadata_path, "rb") as xml:
+        parser.ParseFile(xml)
+
+    return (
+        tuple(handler.descriptions),
+        tuple(handler.maintainers),
+        tuple(handler.useflags),
+        tuple(handler.upstream),
+    )
+
+
+def _cache_key(metadata_path):
+    """Return the parse cache key for metadata.xml.
+
+    The mtime and size are part of the key, so that a file modified since
+    it was last read is parsed again.
+    """
+
+    st = os.stat(metadata_path)
+    return (os.path.abspath(metadata_path), st.st_mtime_ns, st.st_size)
+
+
+def _cache_get(key):
+    """Return the cached parse results for C{key}, or None."""
+
+    with _CACHE_LOCK:
+        parsed = _CACHE.get(key)
+        if parsed is not None:
+            _CACHE.move_to_end(key)
+        return parsed
+
+
+def _cache_put(key, parsed):
+    """Store parse results, dropping the least recently used if full."""
+
+    with _CACHE_LOCK:
+        _CACHE[key] = parsed
+        _CACHE.move_to_end(key)
+        if len(_CACHE) > _CACHE_SIZE:
+            _CACHE.popitem(last=False)
+
+
+def _load(metadata_path):
+    """Parse metadata.xml, reusing earlier results for an unchanged file."""
+
+    key = _cache_key(metadata_path)
+    parsed = _cache_get(key)
+    if parsed is None:
+        parsed = _parse(metadata_path)
+        _cache_put(key, parsed)
+    return parsed
+
 
 # =======
 # Classes
 # =======
 
 
-class _Maintainer:
-    """An object for representing one maintainer.
+class _Maintainer(
+    collections.namedtuple(
+        "_Maintainer",
+        ("email", "name", "description", "restrict", "status"),
+        defaults=(None,) * 5,
+    )
+):
+    """A read-only object for representing one maintainer.
 
     @type email: str or None
     @ivar email: Maintainer's email address. Used for both Gentoo and upstream.
@@ -64,21 +168,14 @@ class _Maintainer:
     @ivar status: If set, either 'active' or 'inactive'. Upstream only.
     """
 
-    def __init__(self, node):
-        self.email = None
-        self.name = None
-        self.description = None
-        self.restrict = node.get("restrict")
-        self.status = node.get("status")
-        for attr in node.iter():
-            setattr(self, attr.tag, attr.text)
+    __slots__ = ()
 
     def __repr__(self):
         return "<%s %r>" % (self.__class__.__name__, self.email)
 
 
-class _Useflag:
-    """An object for representing one USE flag.
+class _Useflag(collections.namedtuple("_Useflag", ("name", "restrict", "description"))):
+    """A read-only object for representing one USE flag.
 
     @todo: Is there any way to have a keyword option to leave in
             <pkg> and <cat> for later processing?
@@ -91,83 +188,178 @@ class _Useflag:
     @ivar description: description of the USE flag
     """
 
-    def __init__(self, node):
-        self.name = node.get("name")
-        self.restrict = node.get("restrict")
-        _desc = ""
-        if node.text:
-            _desc = node.text
-        for child in node.iter():
-            # prevent duplicate text
-            if child.text and child.text not in _desc:
-                _desc += child.text
-            if child.tail and not child.tail in _desc:
-                _desc += child.tail
-        # This takes care of tabs and newlines left from the file
-        self.description = re.sub(r"\s+", " ", _desc)
+    __slots__ = ()
 
     def __repr__(self):
         return "<%s %r>" % (self.__class__.__name__, self.name)
 
 
-class _Upstream:
-    """An object for representing one package's upstream.
+class _Upstream(
+    collections.namedtuple(
+        "_Upstream", ("maintainers", "changelogs", "docs", "bugtrackers", "remoteids")
+    )
+):
+    """A read-only object for representing one package's upstream.
 
-    @type maintainers: list
+    @type maintainers: tuple
     @ivar maintainers: L{_Maintainer} objects for each upstream maintainer
-    @type changelogs: list
+    @type changelogs: tuple
     @ivar changelogs: URLs to upstream's ChangeLog file in str format
-    @type docs: list
+    @type docs: tuple
     @ivar docs: Sequence of tuples containing URLs to upstream documentation
             in the first slot and 'lang' attribute in the second, e.g.,
-            [('http.../docs/en/tut.html', None), ('http.../doc/fr/tut.html', 'fr')]
-    @type bugtrackers: list
+            (('http.../docs/en/tut.html', None), ('http.../doc/fr/tut.html', 'fr'))
+    @type bugtrackers: tuple
     @ivar bugtrackers: URLs to upstream's bugtracker. May also contain an email
             address if prepended with 'mailto:'
-    @type remoteids: list
+    @type remoteids: tuple
     @ivar remoteids: Sequence of tuples containing the project's hosting site
             name in the first slot and the project's ID name or number for that
-            site in the second, e.g., [('sourceforge', 'systemrescuecd')]
+            site in the second, e.g., (('sourceforge', 'systemrescuecd'),)
     """
 
-    def __init__(self, node):
-        self.node = node
-        self.maintainers = self.upstream_maintainers()
-        self.changelogs = self.upstream_changelogs()
-        self.docs = self.upstream_documentation()
-        self.bugtrackers = self.upstream_bugtrackers()
-        self.remoteids = self.upstream_remoteids()
+    __slots__ = ()
 
     def __repr__(self):
-        return "<%s %r>" % (self.__class__.__name__, self.__dict__)
+        return "<%s %r>" % (self.__class__.__name__, self._asdict())
 
-    def upstream_bugtrackers(self):
-        """Retrieve upstream bugtracker location from xml node."""
-        return [e.text for e in self.node.findall("bugs-to")]
 
-    def upstream_changelogs(self):
-        """Retrieve upstream changelog location from xml node."""
-        return [e.text for e in self.node.findall("changelog")]
+class _MetaDataHandler:
+    """Build the sections of metadata.xml from expat parser callbacks.
 
-    def upstream_documentation(self):
-        """Retrieve upstream documentation location from xml node."""
-        result = []
-        for elem in self.node.findall("doc"):
-            lang = elem.get("lang")
-            result.append((elem.text, lang))
-        return result
-
-    def upstream_maintainers(self):
-        """Retrieve upstream maintainer information from xml node."""
-        return [_Maintainer(m) for m in self.node.findall("maintainer")]
+    Elements are identified by their path below <pkgmetadata>; elements
+    this module does not use are skipped without creating any objects.
+    """
 
-    def upstream_remoteids(self):
-        """Retrieve upstream remote ID from xml node."""
-        return [(e.text, e.get("type")) for e in self.node.findall("remote-id")]
+    def __init__(self):
+        self.descriptions = []
+        self.maintainers = []
+        self.useflags = []
+        self.upstream = []
+        # Path of the open element below the root, None before the root
+        self._path = None
+        # Attributes and offset into _text of each open element
+        self._open = []
+        # Character data of the current top-level element
+        self._text = []
+        # Children of the <maintainer> being read
+        self._fields = {}
+        # Children of the <upstream> being read, keyed by tag
+        self._upstream = {tag: [] for tag in self._UPSTREAM_TAGS}
+
+    def start(self, tag, attrs):
+        """Record an opened element's path, attributes and text offset."""
+        if self._path is None:
+            # <pkgmetadata>
+            self._path = ()
+            return
+        self._path += (tag,)
+        self._open.append((attrs, len(self._text)))
+
+    def data(self, text):
+        """Collect character data inside a top-level element."""
+        if self._path:
+            self._text.append(text)
+
+    def end(self, tag):
+        """Run the handler for a closed element, if its path has one."""
+        path = self._path
+        if not path:
+            return
+        attrs, offset = self._open.pop()
+        entry = self._END_HANDLERS.get(path)
+        if entry is not None:
+            handler, wants_text = entry
+            text = "".join(self._text[offset:]) if wants_text else None
+            handler(self, tag, attrs, text)
+        self._path = path[:-1]
+        if not self._path:
+            del self._text[:]
+
+    def _end_description(self, tag, attrs, text):
+        self.descriptions.append(text or None)
+
+    def _end_maintainer_field(self, tag, attrs, text):
+        # The first of each field wins
+        self._fields.setdefault(tag, text or None)
+
+    def _make_maintainer(self, attrs):
+        status = attrs.get("status")
+        maintainer = _Maintainer(
+            restrict=attrs.get("restrict"),
+            status=status and sys.intern(status),
+            **self._fields
+        )
+        self._fields = {}
+        return maintainer
+
+    def _end_maintainer(self, tag, attrs, text):
+        self.maintainers.append(self._make_maintainer(attrs))
+
+    def _end_flag(self, tag, attrs, text):
+        # This takes care of tabs and newlines left from the file
+        description = " ".join(text.split())
+        self.useflags.append(
+            _Useflag(attrs.get("name"), attrs.get("restrict"), description)
+        )
+
+    def _end_upstream_maintainer(self, tag, attrs, text):
+        self._upstream["maintainer"].append(self._make_maintainer(attrs))
+
+    def _end_upstream_field(self, tag, attrs, text):
+        self._upstream[tag].append(text or None)
+
+    def _end_upstream_doc(self, tag, attrs, text):
+        lang = attrs.get("lang")
+        self._upstream["doc"].append((text or None, lang and sys.intern(lang)))
+
+    def _end_upstream_remoteid(self, tag, attrs, text):
+        site = attrs.get("type")
+        self._upstream["remote-id"].append((text or None, site and sys.intern(site)))
+
+    def _end_upstream(self, tag, attrs, text):
+        self.upstream.append(
+            _Upstream(*(tuple(self._upstream[tag]) for tag in self._UPSTREAM_TAGS))
+        )
+        self._upstream = {tag: [] for tag in self._UPSTREAM_TAGS}
+
+    _UPSTREAM_TAGS = ("maintainer", "changelog", "doc", "bugs-to", "remote-id")
+
+    # Handler for each element path, and whether it needs the element's
+    # text; containers only gather what their children left behind
+    _END_HANDLERS = {
+        ("longdescription",): (_end_description, True),
+        ("maintainer",): (_end_maintainer, False),
+        ("maintainer", "email"): (_end_maintainer_field, True),
+        ("maintainer", "name"): (_end_maintainer_field, True),
+        ("maintainer", "description"): (_end_maintainer_field, True),
+        ("use", "flag"): (_end_flag, True),
+        ("upstream",): (_end_upstream, False),
+        ("upstream", "maintainer"): (_end_upstream_maintainer, False),
+        ("upstream", "maintainer", "email"): (_end_maintainer_field, True),
+        ("upstream", "maintainer", "name"): (_end_maintainer_field, True),
+        ("upstream", "maintainer", "description"): (_end_maintainer_field, True),
+        ("upstream", "changelog"): (_end_upstream_field, True),
+        ("upstream", "doc"): (_end_upstream_doc, True),
+        ("upstream", "bugs-to"): (_end_upstream_field, True),
+        ("upstream", "remote-id"): (_end_upstream_remoteid, True),
+    }
 
 
 class MetaData:
-    """Access metadata.xml"""
+    """Access metadata.xml
+
+    Parsed files are cached, so all instances for an unchanged file share
+    the same read-only result tuples and records.
+    """
+
+    __slots__ = (
+        "metadata_path",
+        "_descriptions",
+        "_maintainers",
+        "_useflags",
+        "_upstream",
+    )
 
     def __init__(self, metadata_path):
         """Parse a valid metadata.xml file.
@@ -175,81 +367,140 @@ class MetaData:
         @type metadata_path: str
         @param metadata_path: path to a valid metadata.xml file
         @raise IOError: if C{metadata_path} can not be read
+        @raise xml.parsers.expat.ExpatError: if C{metadata_path} is not valid
+                XML
         """
 
         self.metadata_path = metadata_path
-        self._xml_tree = etree.parse(metadata_path)
-
-        # Used for caching
-        self._descriptions = None
-        self._maintainers = None
-        self._useflags = None
-        self._upstream = None
+        self._set_sections(_load(metadata_path))
 
     def __repr__(self):
         return "<%s %r>" % (self.__class__.__name__, self.metadata_path)
 
-    def descriptions(self):
-        """Return a list of text nodes for <longdescription>.
+    def _set_sections(self, parsed):
+        # Parsed results are immutable, so instances can share them
+        self._descriptions, self._maintainers, self._useflags, self._upstream = parsed
+
+    @classmethod
+    def parse_many(cls, paths, workers=None):
+        """Parse many metadata.xml files in parallel.
 
+        Files already in the parse cache are not parsed again. The rest are
+        parsed by a pool of worker processes and added to the cache, unless
+        there is only one worker or too few files to be worth starting one,
+        in which case they are parsed in this process.
+
+        @type paths: iterable
+        @param paths: paths to valid metadata.xml files
+        @type workers: int or None
+        @param workers: number of worker processes, defaults to the number
+                of CPUs
         @rtype: list
+        @return: a L{MetaData} object for each of C{paths}, in the same order
+        @raise IOError: if one of C{paths} can not be read
+        @raise ValueError: if C{workers} is less than 1
+        """
+
+        if workers is not None and workers < 1:
+            raise ValueError("workers must be at least 1")
+
+        paths = list(paths)
+        keys = [_cache_key(metadata_path) for metadata_path in paths]
+        parsed = {}
+        todo = {}
+        for metadata_path, key in zip(paths, keys):
+            if key in parsed or key in todo:
+                continue
+            sections = _cache_get(key)
+            if sections is None:
+                todo[key] = metadata_path
+            else:
+                parsed[key] = sections
+
+        cpus = os.cpu_count() if workers is None else workers
+        if cpus == 1 or len(todo) < _PARSE_CHUNKSIZE:
+            results = map(_parse, todo.values())
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                results = list(
+                    executor.map(_parse, todo.values(), chunksize=_PARSE_CHUNKSIZE)
+                )
+        for key, sections in zip(todo, results):
+            _cache_put(key, sections)
+            parsed[key] = sections
+
+        result = []
+        for metadata_path, key in zip(paths, keys):
+            sections = parsed[key]
+            metadata = cls.__new__(cls)
+            metadata.metadata_path = metadata_path
+            metadata._set_sections(sections)
+            result.append(metadata)
+        return result
+
+    @staticmethod
+    def cache_clear():
+        """Forget all metadata.xml files parsed so far.
+
+        Files are only parsed again when their mtime or size changes, so
+        long-running processes may want to call this to release memory.
+        Existing instances keep the results they were given; those are
+        read-only and shared with any other instance for the same file.
+        """
+
+        with _CACHE_LOCK:
+            _CACHE.clear()
+
+    def descriptions(self):
+        """Return a tuple of text nodes for <longdescription>.
+
+        @rtype: tuple
         @return: package description in string format
         @todo: Support the C{lang} attribute
         """
 
-        if self._descriptions is not None:
-            return self._descriptions
-
-        long_descriptions = self._xml_tree.findall("longdescription")
-        self._descriptions = [e.text for e in long_descriptions]
         return self._descriptions
 
     def maintainers(self):
         """Get maintainers' name, email and description.
 
-        @rtype: list
+        @rtype: tuple
         @return: a sequence of L{_Maintainer} objects in document order.
         """
 
-        if self._maintainers is not None:
-            return self._maintainers
+        return self._maintainers
 
-        self._maintainers = []
-        for node in self._xml_tree.findall("maintainer"):
-            self._maintainers.append(_Maintainer(node))
+    def maintainers_table(self):
+        """Get maintainers' fields as one tuple per field.
 
-        return self._maintainers
+        Useful for callers that only want a column or two, e.g.
+        C{md.maintainers_table()["email"]}. The columns are built from
+        maintainers() in a single pass on each call.
+
+        @rtype: dict
+        @return: tuples of 'email', 'name', 'description', 'restrict' and
+                'status' values, each in document order.
+        """
+
+        columns = list(zip(*self._maintainers)) or [()] * len(_Maintainer._fields)
+        return dict(zip(_Maintainer._fields, columns))
 
     def use(self):
         """Get names and descriptions for USE flags defined in metadata.
 
-        @rtype: list
+        @rtype: tuple
         @return: a sequence of L{_Useflag} objects in document order.
         """
 
-        if self._useflags is not None:
-            return self._useflags
-
-        self._useflags = []
-        for node in self._xml_tree.iter("flag"):
-            self._useflags.append(_Useflag(node))
-
         return self._useflags
 
     def upstream(self):
         """Get upstream contact information.
 
-        @rtype: list
+        @rtype: tuple
         @return: a sequence of L{_Upstream} objects in document order.
         """
 
-        if self._upstream is not None:
-            return self._upstream
-
-        self._upstream = []
-        for node in self._xml_tree.findall("upstream"):
-            self._upstream.append(_Upstream(node))
-
         return self._upstream
 
 
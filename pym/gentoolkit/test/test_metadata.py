@@ -0,0 +1,207 @@
+import os
+import unittest
+from tempfile import NamedTemporaryFile, TemporaryDirectory
+from xml.parsers.expat import ExpatError
+
+from gentoolkit import metadata
+from gentoolkit.metadata import MetaData
+
+METADATA_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<!DOCTYPE pkgmetadata SYSTEM "https://www.gentoo.org/dtd/metadata.dtd">
+<pkgmetadata>
+	<maintainer type="person">
+		<email>williamh@gentoo.org</email>
+		<name>William Hubbs</name>
+	</maintainer>
+	<maintainer type="project" restrict="&gt;=app-accessibility/espeak-ng-1.50">
+		<email>accessibility@gentoo.org</email>
+		<name>Gentoo Accessibility Project</name>
+		<description>Please CC on bugs</description>
+	</maintainer>
+	<longdescription>Speech synthesizer, forked from
+		<pkg>app-accessibility/espeak</pkg></longdescription>
+	<use>
+		<flag name="async">Enables <!-- not --> asynchronous commands</flag>
+		<flag name="man">Builds and installs manpage with
+			<pkg>app-text/ronn</pkg>
+		</flag>
+		<flag name="mbrola" restrict="&gt;=app-accessibility/espeak-ng-1.49">Adds
+			support for <pkg>app-accessibility/mbrola</pkg> voices</flag>
+	</use>
+	<upstream>
+		<maintainer status="active">
+			<email>msclrhd@gmail.com</email>
+			<name>Reece H. Dunn</name>
+		</maintainer>
+		<changelog>https://github.com/espeak-ng/espeak-ng/releases.atom</changelog>
+		<doc lang="en">https://github.com/espeak-ng/espeak-ng/tree/master/docs</doc>
+		<bugs-to>https://github.com/espeak-ng/espeak-ng/issues</bugs-to>
+		<remote-id type="github">espeak-ng/espeak-ng</remote-id>
+	</upstream>
+</pkgmetadata>
+"""
+
+
+class TestMetaData(unittest.TestCase):
+    def setUp(self):
+        self.xml = NamedTemporaryFile(prefix="metadataunittest", suffix=".xml")
+        self.xml.write(METADATA_XML)
+        self.xml.flush()
+        self.metadata = MetaData(self.xml.name)
+
+    def tearDown(self):
+        self.xml.close()
+
+    def test_missing_file(self):
+        path = self.xml.name + ".missing"
+        self.assertFalse(os.path.exists(path))
+        self.assertRaises(IOError, MetaData, path)
+
+    def test_invalid_file(self):
+        with NamedTemporaryFile(prefix="metadataunittest", suffix=".xml") as xml:
+            xml.write(METADATA_XML[:-20])
+            xml.flush()
+            self.assertRaises(ExpatError, MetaData, xml.name)
+
+    def test_descriptions(self):
+        self.assertEqual(
+            list(self.metadata.descriptions()),
+            ["Speech synthesizer, forked from\n\t\tapp-accessibility/espeak"],
+        )
+
+    def test_maintainers(self):
+        maints = self.metadata.maintainers()
+        self.assertEqual(
+            [m.email for m in maints],
+            ["williamh@gentoo.org", "accessibility@gentoo.org"],
+        )
+        self.assertEqual(maints[0].name, "William Hubbs")
+        self.assertEqual(maints[0].description, None)
+        self.assertEqual(maints[0].restrict, None)
+        self.assertEqual(maints[1].description, "Please CC on bugs")
+        self.assertEqual(maints[1].restrict, ">=app-accessibility/espeak-ng-1.50")
+
+    def test_read_only(self):
+        maint = self.metadata.maintainers()[0]
+        flag = self.metadata.use()[0]
+        up = self.metadata.upstream()[0]
+        with self.assertRaises(AttributeError):
+            maint.email = "poisoned@example.org"
+        with self.assertRaises(AttributeError):
+            flag.description = "poisoned"
+        with self.assertRaises(AttributeError):
+            up.remoteids = ()
+        with self.assertRaises(TypeError):
+            self.metadata.use()[0] = flag
+
+        other = MetaData(self.xml.name)
+        self.assertEqual(other.maintainers()[0].email, "williamh@gentoo.org")
+        self.assertEqual(other.use()[0].description, "Enables asynchronous commands")
+        self.assertEqual(
+            list(other.upstream()[0].remoteids), [("espeak-ng/espeak-ng", "github")]
+        )
+
+    def test_maintainers_table(self):
+        self.assertEqual(
+            self.metadata.maintainers_table(),
+            {
+                "email": ("williamh@gentoo.org", "accessibility@gentoo.org"),
+                "name": ("William Hubbs", "Gentoo Accessibility Project"),
+                "description": (None, "Please CC on bugs"),
+                "restrict": (None, ">=app-accessibility/espeak-ng-1.50"),
+                "status": (None, None),
+            },
+        )
+
+    def test_use(self):
+        flags = self.metadata.use()
+        self.assertEqual([f.name for f in flags], ["async", "man", "mbrola"])
+        self.assertEqual(flags[0].description, "Enables asynchronous commands")
+        self.assertEqual(
+            flags[1].description, "Builds and installs manpage with app-text/ronn"
+        )
+        self.assertEqual(
+            flags[2].description,
+            "Adds support for app-accessibility/mbrola voices",
+        )
+        self.assertEqual(flags[2].restrict, ">=app-accessibility/espeak-ng-1.49")
+
+    def test_upstream(self):
+        upstream = self.metadata.upstream()
+        self.assertEqual(len(upstream), 1)
+        up = upstream[0]
+        self.assertEqual([m.email for m in up.maintainers], ["msclrhd@gmail.com"])
+        self.assertEqual(up.maintainers[0].name, "Reece H. Dunn")
+        self.assertEqual(up.maintainers[0].status, "active")
+        self.assertEqual(
+            list(up.changelogs),
+            ["https://github.com/espeak-ng/espeak-ng/releases.atom"],
+        )
+        self.assertEqual(
+            list(up.docs),
+            [("https://github.com/espeak-ng/espeak-ng/tree/master/docs", "en")],
+        )
+        self.assertEqual(
+            list(up.bugtrackers), ["https://github.com/espeak-ng/espeak-ng/issues"]
+        )
+        self.assertEqual(list(up.remoteids), [("espeak-ng/espeak-ng", "github")])
+
+    def test_cache(self):
+        other = MetaData(self.xml.name)
+        self.assertIs(other.maintainers(), self.metadata.maintainers())
+        self.assertIsInstance(other.maintainers(), tuple)
+
+        self.xml.write(b"<!-- modified -->\n")
+        self.xml.flush()
+        changed = MetaData(self.xml.name)
+        self.assertIsNot(changed.maintainers()[0], self.metadata.maintainers()[0])
+
+        MetaData.cache_clear()
+        cleared = MetaData(self.xml.name)
+        self.assertIsNot(cleared.maintainers()[0], changed.maintainers()[0])
+
+    def test_parse_many(self):
+        path = self.xml.name + ".missing"
+        self.assertFalse(os.path.exists(path))
+        self.assertRaises(IOError, MetaData.parse_many, [self.xml.name, path])
+
+        self.assertRaises(ValueError, MetaData.parse_many, [self.xml.name], 0)
+
+        result = MetaData.parse_many([self.xml.name] * 3, workers=2)
+        self.assertEqual([m.metadata_path for m in result], [self.xml.name] * 3)
+        for md in result:
+            self.assertEqual([f.name for f in md.use()], ["async", "man", "mbrola"])
+            self.assertEqual(
+                list(md.upstream()[0].remoteids),
+                [("espeak-ng/espeak-ng", "github")],
+            )
+
+    def test_parse_many_pool(self):
+        with TemporaryDirectory(prefix="metadataunittest") as tmpdir:
+            paths = []
+            for i in range(metadata._PARSE_CHUNKSIZE + 1):
+                path = os.path.join(tmpdir, "metadata-%d.xml" % i)
+                with open(path, "wb") as xml:
+                    xml.write(METADATA_XML)
+                paths.append(path)
+
+            result = MetaData.parse_many(paths, workers=2)
+            self.assertEqual([m.metadata_path for m in result], paths)
+            for metadata_path, parsed in zip(paths, result):
+                self.assertEqual(
+                    [f.name for f in parsed.use()], ["async", "man", "mbrola"]
+                )
+                # Results from the workers went into this process's cache
+                self.assertIs(MetaData(metadata_path).use(), parsed.use())
+
+
+def test_main():
+    suite = unittest.TestLoader().loadTestsFromTestCase(TestMetaData)
+    unittest.TextTestRunner(verbosity=2).run(suite)
+
+
+test_main.__test__ = False
+
+
+if __name__ == "__main__":
+    test_main()
@@ -1,6 +1,8 @@
 #!/usr/bin/env python
 
+import functools
 import re
+import shutil
 import sys
 import subprocess
 from distutils import core
@@ -83,22 +85,27 @@ class set_version(core.Command):
         ver = "git" if __version__ == "9999" else __version__
         print("Setting version to %s" % ver)
 
+        @functools.lru_cache(maxsize=None)
+        def compile_pattern(pattern, label):
+            return re.compile(pattern % re.escape(label), re.M)
+
         def sub(files, pattern):
-            for f in files:
-                updated_file = []
-                with io.open(f[0], "r", 1, "utf_8") as s:
-                    for line in s:
-                        newline = re.sub(pattern % f[1], '"%s"' % ver, line, 1)
-                        updated_file.append(newline)
-                with io.open(f[0], "w", 1, "utf_8") as s:
-                    s.writelines(updated_file)
+            for path, label in files:
+                with io.open(path, "r", encoding="utf_8") as s:
+                    content = s.read()
+                content = compile_pattern(pattern, label).sub('"%s"' % ver, content)
+                tmp_path = path + ".tmp"
+                with io.open(tmp_path, "w", encoding="utf_8") as s:
+                    s.write(content)
+                shutil.copymode(path, tmp_path)
+                os.replace(tmp_path, path)
 
         quote = r'[\'"]{1}'
-        bash_re = r"(?<=%s)" + quote + "[^'\"]*" + quote
+        bash_re = r"(?<=%s)" + quote + "[^'\"\n]*" + quote
         sub(bash_scripts, bash_re)
-        python_re = r"(?<=^%s)" + quote + "[^'\"]*" + quote
+        python_re = r"(?<=^%s)" + quote + "[^'\"\n]*" + quote
         sub(python_scripts, python_re)
-        man_re = r'(?<=^.TH "%s" "[0-9]" )' + quote + "[^'\"]*" + quote
+        man_re = r'(?<=^.TH "%s" "[0-9]" )' + quote + "[^'\"\n]*" + quote
         sub(manpages, man_re)
 
 
@@ -116,11 +123,27 @@ class TestCommand(Command):
         raise SystemExit(subprocess.call(args))
 
 
-packages = [
-    str(".".join(root.split(os.sep)[1:]))
-    for root, dirs, files in os.walk("pym/gentoolkit")
-    if "__init__.py" in files
-]
+def walk_pkgs(root):
+    """Yield root and every package directory below it.
+
+    Directories without an __init__.py are not packages, so they are
+    not descended into.
+    """
+    subdirs = []
+    has_init = False
+    with os.scandir(root) as it:
+        for entry in it:
+            if entry.name == "__init__.py":
+                has_init = True
+            elif entry.is_dir(follow_symlinks=False):
+                subdirs.append(entry.path)
+    if has_init:
+        yield root
+        for subdir in subdirs:
+            yield from walk_pkgs(subdir)
+
+
+packages = [".".join(root.split(os.sep)[1:]) for root in walk_pkgs("pym/gentoolkit")]
 
 test_data = {
     "gentoolkit": [